@@ -1,12 +1,23 @@
 import abc
+import asyncio
 import enum
+import heapq
+import inspect
+import io
 import json
+import marshal
 import os
+import stat
 import time
 import pytoolbox.utility.logger as logger
 import pytoolbox.utility.os as os_utils
 import pytoolbox.settings as settings
 
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
 __version__ = '0.2'
 __author__ = 'Knut Andreas Hasund'
 
@@ -27,12 +38,17 @@ class FileMonitorable(metaclass=abc.ABCMeta):
     def file_monitor_get_files(self) -> list:
         """Should return a list of strings containing all files that should be monitored each time it is called.
         The string must contain the absolute path of each file.
+
+        While monitoring, this is called from a worker thread, and may run at the same time as
+        file_monitor_action_on_change. Any state shared between the two must be safe to access from both threads.
         """
         pass
 
     @abc.abstractmethod
     def file_monitor_action_on_change(self, change_list, file_list, **kwargs) -> None:
-        """Performs some action when one or more file has been changed.
+        """Performs some action when one or more file has been changed. May also be implemented as a coroutine
+        function, in which case it is awaited by the monitor. Called on the thread running the monitor's event loop,
+        see file_monitor_get_files.
 
         Receives keyword arguments from the file monitor:
             change_list: A list of files that have been changed (absolute paths).
@@ -41,6 +57,13 @@ class FileMonitorable(metaclass=abc.ABCMeta):
         """
         pass
 
+    def file_monitor_get_dir_roots(self) -> list:
+        """Optional. May return a list of directories (absolute paths) that contain the monitored files. The monitor
+        will then walk these directories with os.scandir when scanning for changes, instead of checking each file on
+        its own. Files outside of the directories are still checked one by one. Returns an empty list by default.
+        """
+        return []
+
 
 class FileMonitorActionType(enum.Enum):
     SEARCH_FOR_NEW_FILES = 1
@@ -70,20 +93,21 @@ class FileMonitorAction:
 
 
 class FileMonitorActionQueue:
-    """Minimal implementation of a sorted queue"""
-    # TODO: Insert without sorting the entire list (Only needed if more actions are added)
+    """Minimal implementation of a priority queue, backed by a binary heap"""
     def __init__(self):
         self.queue = []
 
     def put(self, action: FileMonitorAction):
-        self.queue.append(action)
-        self.queue.sort()
+        heapq.heappush(self.queue, action)
 
     def get(self):
-        return self.queue.pop(0) if len(self.queue) > 0 else None
+        return heapq.heappop(self.queue) if len(self.queue) > 0 else None
+
+    def peek(self):
+        return self.queue[0] if len(self.queue) > 0 else None
 
     def __str__(self):
-        return str(self.queue)
+        return str(sorted(self.queue))
 
 
 class FileMonitor:
@@ -97,16 +121,22 @@ class FileMonitor:
     # static init
     __DEFAULT_NEW_FILES_SEARCH_FREQUENCY = 30
     __DEFAULT_FILE_UPDATE_SCAN_FREQUENCY = 480
+    __DEFAULT_DEBOUNCE_MS = 100
     __NANO_DIVISOR = 1000000000
     __SECS_IN_HOUR = 60 * 60
     __NANO_SECS_IN_HOUR = __SECS_IN_HOUR * __NANO_DIVISOR
     __CACHE_FILE_ENDING = '.cache'
+    __JOURNAL_FILE_ENDING = '.jrn'
+    __JOURNAL_COMPACTION_RATIO = 0.25
+    __STAT_BATCH_SIZE = 256
 
     def __init__(self,
                  subscriber: FileMonitorable,
                  new_files_search_frequency: int = __DEFAULT_NEW_FILES_SEARCH_FREQUENCY,
                  file_update_scan_frequency: int = __DEFAULT_FILE_UPDATE_SCAN_FREQUENCY,
                  fresh_start: bool = False,
+                 use_file_watcher: bool = True,
+                 debounce_ms: int = __DEFAULT_DEBOUNCE_MS,
                  **action_kwargs):
         """Constructor
 
@@ -117,123 +147,420 @@ class FileMonitor:
         file list (to check for deleted or added files).
 
         :param file_update_scan_frequency: Number representing the number of times per hour the monitor checks the files
-        in its file list for changes.
+        in its file list for changes. Only used when the monitor falls back to polling.
 
         :param fresh_start: If true the monitor will ignore the cache and start as if it is run for the first time. This
         will trigger an update action for each file at the start of the run.
 
+        :param use_file_watcher: If true and the watchfiles package is installed, changes are picked up from OS-level
+        file system notifications instead of scanning the files periodically.
+
+        :param debounce_ms: Changes made within this many milliseconds of each other are reported to the subscriber in
+        a single action.
+
         :param action_kwargs: Dict of arguments that should be passed to the action method of the subscriber.
         """
         self.__subscriber = subscriber
-        self.__new_files_search_frequency = new_files_search_frequency
-        self.__file_update_scan_frequency = file_update_scan_frequency
+        # Periods between actions in ns, None if the action is disabled
+        self.__new_files_search_period_ns = \
+            self.__NANO_SECS_IN_HOUR // new_files_search_frequency if new_files_search_frequency > 0 else None
+        self.__file_update_scan_period_ns = \
+            self.__NANO_SECS_IN_HOUR // file_update_scan_frequency if file_update_scan_frequency > 0 else None
+        self.__use_file_watcher = use_file_watcher and watchfiles is not None
+        self.__debounce_ms = debounce_ms
+        # Changes waiting to be reported, the dicts are used as ordered sets
+        self.__pending_changes = dict()
+        self.__pending_removals = dict()
+        self.__last_report_time = 0
+        self.__cache_lock = asyncio.Lock()
+        # Set to make the file watcher pick up a new set of directories
+        self.__watch_restart = asyncio.Event()
+        self.__watched_directories = set()
         self.__metadata_cache_path = os.path.join(
             settings.DATA_CACHE_FOLDER,
             settings.FILE_MONITOR_CACHE_FOLDER_NAME,
             self.__subscriber.id + self.__CACHE_FILE_ENDING
         )
+        self.__journal_path = os.path.join(
+            settings.DATA_CACHE_FOLDER,
+            settings.FILE_MONITOR_CACHE_FOLDER_NAME,
+            self.__subscriber.id + self.__JOURNAL_FILE_ENDING
+        )
+        self.__cache_folder_exists = False
         self.action_kwargs = action_kwargs
         # Init logger
         self.__log_manager = logger.LogManager(f"FileMonitor<{self.__subscriber.id}>", settings.LOG_LEVEL)
         self.__log = self.__log_manager.log
-        # Read from cache
+        self.__debug_enabled = self.__log_manager.is_enabled(logger.LogLevel.DEBUG)
+        # Read from cache. The cache consists of a snapshot and a journal of the updates made since the snapshot was
+        # written. The journal length is None when unknown, which rewrites the snapshot on the next update.
         self.__file_cache: dict = dict()
+        self.__journal_length = None
         if os.path.exists(self.__metadata_cache_path) and not fresh_start:
             try:
-                with open(self.__metadata_cache_path, 'r') as f:
-                    file_cache = json.loads(f.read())
-                    if not isinstance(file_cache, dict):
-                        raise SyntaxError("Cache is not formatted correctly.")
-                    self.__file_cache = file_cache
-            except (json.JSONDecodeError, SyntaxError) as e:
-                self.__log(f'Error when parsing file cache to JSON: "{e}", resetting cache.', logger.LogLevel.ERROR)
+                with open(self.__metadata_cache_path, 'rb') as f:
+                    data = f.read()
+                # Caches written by earlier versions are JSON, convert them to the current format
+                is_json = data[:2] in (b'{"', b'{}')
+                file_cache = json.loads(data) if is_json else marshal.loads(data)
+                if not isinstance(file_cache, dict):
+                    raise SyntaxError("Cache is not formatted correctly.")
+                self.__file_cache = file_cache
+                if is_json:
+                    self.__write_snapshot(marshal.dumps(self.__file_cache))
+            except (json.JSONDecodeError, SyntaxError, ValueError, EOFError, TypeError) as e:
+                self.__log(f'Error when parsing file cache: "{e}", resetting cache.', logger.LogLevel.ERROR)
+        if not fresh_start:
+            self.__journal_length = self.__replay_journal()
         # Find files
-        self.__find_files()
+        self.__update_file_list(self.__subscriber.file_monitor_get_files())
         # Prepare queue for monitoring
         self.__action_queue = FileMonitorActionQueue()
-        self.__queue_new_action(FileMonitorActionType.SCAN_FILES_FOR_CHANGES)
+        if not self.__use_file_watcher:
+            self.__queue_new_action(FileMonitorActionType.SCAN_FILES_FOR_CHANGES)
         self.__queue_new_action(FileMonitorActionType.SEARCH_FOR_NEW_FILES)
 
     def monitor(self):
-        """Starts the monitoring."""
-        lag_counter = 0
+        """Starts the monitoring and blocks until it is stopped."""
+        asyncio.run(self.run())
+
+    async def run(self):
+        """Starts the monitoring in the running event loop, allowing several monitors to share one loop."""
         self.__log(f'Monitoring {len(self.file_list)} files.')
-        self.__log(f'Checking for changes every:   {self.__SECS_IN_HOUR / self.__DEFAULT_FILE_UPDATE_SCAN_FREQUENCY}s')
-        self.__log(f'Checking for new files every: {self.__SECS_IN_HOUR / self.__DEFAULT_NEW_FILES_SEARCH_FREQUENCY}s')
+        if self.__use_file_watcher:
+            self.__log('Checking for changes using file system notifications')
+        elif self.__file_update_scan_period_ns is not None:
+            self.__log(f'Checking for changes every:   {self.__file_update_scan_period_ns / self.__NANO_DIVISOR}s')
+        if self.__new_files_search_period_ns is not None:
+            self.__log(f'Checking for new files every: {self.__new_files_search_period_ns / self.__NANO_DIVISOR}s')
+
+        if self.__use_file_watcher:
+            await self.__watch()
+        else:
+            await self.__poll()
+
+    async def __watch(self):
+        await asyncio.gather(self.__file_watch_loop(), self.__housekeeping_loop())
+
+    async def __file_watch_loop(self):
+        try:
+            while True:
+                self.__watch_restart.clear()
+                self.__watched_directories = self.__get_directories_to_watch()
+                if len(self.__watched_directories) == 0:
+                    await self.__watch_restart.wait()
+                    continue
+                if self.__debug_enabled:
+                    self.__log(f'Watching {len(self.__watched_directories)} directories', logger.LogLevel.DEBUG)
+                await self.__watch_directories(self.__watched_directories)
+        except OSError as e:
+            # E.g. the inotify watch limit has been reached, or a directory was removed while arming the watch
+            self.__log(f'Could not watch files: "{e}", falling back to scanning for changes.', logger.LogLevel.ERROR)
+        if self.__file_update_scan_period_ns is None:
+            return
+        while True:
+            await asyncio.sleep(self.__file_update_scan_period_ns / self.__NANO_DIVISOR)
+            await self.__scan_files_for_changes()
 
+    async def __watch_directories(self, directories: set):
+        """Watches the directories until the watch is restarted. Changes are buffered from the moment the watch is
+        armed, so every file is scanned once after that to catch changes made while no watch was running.
+        """
+        # awatch coalesces the events within the debounce window. Every file the subscriber returns must be reported,
+        # so nothing is filtered, and only the parent directories themselves are watched.
+        changes_iterator = watchfiles.awatch(*directories, watch_filter=None, recursive=False,
+                                             debounce=self.__debounce_ms, step=50,
+                                             stop_event=self.__watch_restart).__aiter__()
+        next_changes = asyncio.ensure_future(changes_iterator.__anext__())
+        try:
+            # Let awatch arm the watch before scanning
+            await asyncio.sleep(0)
+            await self.__scan_files_for_changes()
+            while True:
+                try:
+                    changes = await next_changes
+                except StopAsyncIteration:
+                    return
+                files = list({path for _, path in changes if path in self.__file_set})
+                if len(files) > 0:
+                    await self.__scan_files_for_changes(files)
+                next_changes = asyncio.ensure_future(changes_iterator.__anext__())
+        finally:
+            next_changes.cancel()
+
+    def __get_directories_to_watch(self) -> set:
+        # Watch the parent directories to keep the number of watched inodes down
+        directories = {os.path.dirname(file) for file in self.file_list}
+        return {directory for directory in directories if os.path.isdir(directory)}
+
+    async def __housekeeping_loop(self):
+        if self.__new_files_search_period_ns is None:
+            return
         while True:
-            self.__log(f'Current queue: {self.__action_queue}', logger.LogLevel.DEBUG)
-            next_action: FileMonitorAction = self.__action_queue.get()
+            # The action stays queued while waiting, so it is not lost if the monitor is cancelled
+            next_action: FileMonitorAction = self.__action_queue.peek()
+            wait_time = (next_action.action_time - time.monotonic_ns()) / self.__NANO_DIVISOR
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            self.__action_queue.get()
+            self.__queue_new_action(next_action.action_type)
+            old_file_set = self.__file_set
+            await self.__find_files()
+            if self.__get_directories_to_watch() != self.__watched_directories:
+                # Every file is scanned once the watch has been re-armed, which includes the new files
+                self.__watch_restart.set()
+            else:
+                # New files are reported the same way the polling scan would report them
+                new_files = [file for file in self.file_list if file not in old_file_set]
+                if len(new_files) > 0:
+                    await self.__scan_files_for_changes(new_files)
 
-            self.__log(f'Next action: {next_action}', logger.LogLevel.DEBUG)
-            wait_time = (next_action.action_time - time.time_ns()) / self.__NANO_DIVISOR
+    async def __poll(self):
+        lag_counter = 0
+        while True:
+            if self.__debug_enabled:
+                self.__log(f'Current queue: {self.__action_queue}', logger.LogLevel.DEBUG)
+            # The action stays queued while waiting, so it is not lost if the monitor is cancelled
+            next_action: FileMonitorAction = self.__action_queue.peek()
+
+            if self.__debug_enabled:
+                self.__log(f'Next action: {next_action}', logger.LogLevel.DEBUG)
+            wait_time = (next_action.action_time - time.monotonic_ns()) / self.__NANO_DIVISOR
             if wait_time > 0:
-                self.__log(f'Waiting for {wait_time}s', logger.LogLevel.DEBUG)
+                if self.__debug_enabled:
+                    self.__log(f'Waiting for {wait_time}s', logger.LogLevel.DEBUG)
                 lag_counter = 0
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
             else:
                 lag_counter += 1
                 if lag_counter > 1:
                     self.__log('Lagging behind. Consider setting scan frequencies to a lower number.', logger.LogLevel.INFO)
+            self.__action_queue.get()
             self.__queue_new_action(next_action.action_type)
             if next_action.action_type == FileMonitorActionType.SCAN_FILES_FOR_CHANGES:
-                self.__scan_files_for_changes()
+                await self.__scan_files_for_changes()
             elif next_action.action_type == FileMonitorActionType.SEARCH_FOR_NEW_FILES:
-                self.__find_files()
+                await self.__find_files()
 
-    def __scan_files_for_changes(self):
-        start_time = time.time_ns()
+    async def __scan_files_for_changes(self, files: list = None):
+        """Checks the given files (defaults to the entire file list) for changes."""
+        start_time = time.perf_counter_ns()
+        loop = asyncio.get_running_loop()
+        files = self.file_list if files is None else files
         # Check for changes
         changed_files = []
-        removed_files = []
-        for file in self.file_list:
-            if os.path.isfile(file):
-                try:
-                    last_modified = os.stat(file).st_mtime_ns
-                except OSError as e:
-                    self.__log(f"Encountered an OSError, skipping file: {e}", logger.LogLevel.ERROR)
-                    continue
-                if not (file in self.__file_cache.keys() and int(self.__file_cache[file]) == last_modified):
-                    changed_files.append(file)
-                    self.__file_cache[file] = last_modified
+        removed = set()
+        results = []
+        dir_roots = self.__subscriber.file_monitor_get_dir_roots() if files is self.file_list else None
+        if dir_roots:
+            changed, files = await loop.run_in_executor(None, self.__check_dir_roots, dir_roots, files)
+            results.append((changed, []))
+        # Each batch is stat'ed and compared to the cache by a single job in the thread pool, so the event loop only
+        # has to deal with the files that changed
+        results += await asyncio.gather(*(
+            loop.run_in_executor(None, self.__check_files, files[i:i + self.__STAT_BATCH_SIZE])
+            for i in range(0, len(files), self.__STAT_BATCH_SIZE)
+        ))
+        for changed, missing_files in results:
+            changed_files += changed
+            self.__file_cache.update(changed)
+            for file in missing_files:
+                removed.add(file)
+                self.__file_cache.pop(file, None)
+        removed_files = list(removed)
+        if len(removed_files) > 0:
+            self.file_list = [file for file in self.file_list if file not in removed]
+            # Rebind rather than update in place, the housekeeping loop may hold on to the old set
+            self.__file_set = self.__file_set - removed
+
+        for file in changed_files:
+            self.__pending_removals.pop(file, None)
+            self.__pending_changes[file] = None
+        for file in removed_files:
+            self.__pending_changes.pop(file, None)
+            self.__pending_removals[file] = None
+        # When polling, changes found within the debounce window of the last report are held back until a later scan
+        if len(self.__pending_changes) > 0 or len(self.__pending_removals) > 0:
+            time_since_report = time.monotonic() - self.__last_report_time
+            if self.__use_file_watcher or time_since_report * 1000 >= self.__debounce_ms:
+                await self.__report_pending_changes()
+
+        if self.__debug_enabled:
+            time_spent = (time.perf_counter_ns() - start_time) / self.__NANO_DIVISOR
+            self.__log(f'[{FileMonitorActionType.SCAN_FILES_FOR_CHANGES}] Time spent: {time_spent}s', logger.LogLevel.DEBUG)
+
+    async def __report_pending_changes(self):
+        changed_files = list(self.__pending_changes)
+        removed_files = list(self.__pending_removals)
+        self.__pending_changes.clear()
+        self.__pending_removals.clear()
+        self.__last_report_time = time.monotonic()
+
+        self.__log()
+        self.__log(f'Changes found: {len(changed_files) + len(removed_files)}', logger.LogLevel.INFO)
+        result = self.__subscriber.file_monitor_action_on_change(change_list=changed_files,
+                                                                 file_list=self.file_list.copy(),
+                                                                 **self.action_kwargs)
+        if inspect.isawaitable(result):
+            await result
+        # write changes to cache
+        await self.__persist_changes(changed_files, removed_files)
+
+    def __check_files(self, files: list) -> tuple:
+        """Returns a dict with the modification time in ns of each file that has changed, and a list of the files that
+        no longer exist.
+        """
+        last_modified_times, missing_files = self.__stat_files(files)
+        return self.__diff_last_modified(last_modified_times), missing_files
+
+    def __check_dir_roots(self, dir_roots: list, files: list) -> tuple:
+        """Returns a dict with the modification time in ns of each file found under the roots that has changed, and a
+        list of the files that were not found under the roots.
+        """
+        last_modified_times = self.__scan_dir_roots(dir_roots, self.__file_set)
+        # Files outside the roots, or that have been removed
+        remaining_files = [file for file in files if file not in last_modified_times]
+        return self.__diff_last_modified(last_modified_times), remaining_files
+
+    def __diff_last_modified(self, last_modified_times: dict) -> dict:
+        get_cached = self.__file_cache.get
+        return {
+            file: last_modified
+            for file, last_modified in last_modified_times.items()
+            if get_cached(file) != last_modified
+        }
+
+    def __stat_files(self, files: list) -> tuple:
+        """Returns a dict with the modification time in ns of each file, and a list of the files that no longer exist.
+        Files that could not be read are logged and left out of both.
+        """
+        last_modified_times = dict()
+        missing_files = []
+        # Bind the lookups used per file to locals once
+        os_stat = os.stat
+        is_regular_file = stat.S_ISREG
+        add_missing = missing_files.append
+        for file in files:
+            try:
+                file_stat = os_stat(file)
+            except (FileNotFoundError, NotADirectoryError):
+                add_missing(file)
+                continue
+            except OSError as e:
+                self.__log(f"Encountered an OSError, skipping file: {e}", logger.LogLevel.ERROR)
+                continue
+            if is_regular_file(file_stat.st_mode):
+                last_modified_times[file] = file_stat.st_mtime_ns
+            else:
+                add_missing(file)
+        return last_modified_times, missing_files
+
+    def __scan_dir_roots(self, dir_roots: list, files: set) -> dict:
+        """Walks the directories and returns a dict with the modification time in ns of each file found in files."""
+        last_modified_times = dict()
+        directories = list(dir_roots)
+        while len(directories) > 0:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif entry.path in files and entry.is_file():
+                            try:
+                                last_modified_times[entry.path] = entry.stat().st_mtime_ns
+                            except OSError as e:
+                                self.__log(f"Encountered an OSError, skipping file: {e}", logger.LogLevel.ERROR)
+            except OSError:
+                # The directory has been removed, its files are picked up as missing
+                continue
+        return last_modified_times
+
+    async def __persist_changes(self, changed_files: list, removed_files: list):
+        """Appends the changes to the journal, or writes a new snapshot once the journal has grown too long."""
+        loop = asyncio.get_running_loop()
+        async with self.__cache_lock:
+            journal_length = self.__journal_length
+            update_count = len(changed_files) + len(removed_files)
+            if journal_length is None or \
+                    journal_length + update_count > len(self.__file_cache) * self.__JOURNAL_COMPACTION_RATIO:
+                await loop.run_in_executor(None, self.__write_snapshot, marshal.dumps(self.__file_cache))
+                self.__journal_length = 0
+            else:
+                # A concurrent scan may have dropped the entry of a removed file in the meantime, which is then
+                # journaled as removed
+                entries = [(file, self.__file_cache.get(file)) for file in changed_files]
+                entries += [(file, None) for file in removed_files]
+                data = b''.join(marshal.dumps(entry) for entry in entries)
+                await loop.run_in_executor(None, self.__append_to_journal, data)
+                self.__journal_length = journal_length + update_count
+
+    def __write_snapshot(self, data: bytes):
+        self.__ensure_cache_folder()
+        temp_path = self.__metadata_cache_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self.__metadata_cache_path)
+        # The snapshot includes everything in the journal
+        open(self.__journal_path, 'wb').close()
+
+    def __append_to_journal(self, data: bytes):
+        self.__ensure_cache_folder()
+        with open(self.__journal_path, 'ab') as f:
+            f.write(data)
+            f.flush()
+
+    def __replay_journal(self):
+        """Applies the journal to the file cache. Returns the number of entries, or None if the journal is corrupt."""
+        if not os.path.exists(self.__journal_path):
+            return 0
+        with open(self.__journal_path, 'rb') as f:
+            journal = io.BytesIO(f.read())
+        journal_size = len(journal.getbuffer())
+        journal_length = 0
+        while journal.tell() < journal_size:
+            try:
+                file, last_modified = marshal.load(journal)
+            except (ValueError, EOFError, TypeError) as e:
+                self.__log(f'Error when parsing file cache journal: "{e}", ignoring the rest.', logger.LogLevel.ERROR)
+                return None
+            if last_modified is None:
+                self.__file_cache.pop(file, None)
             else:
-                self.file_list.pop(self.file_list.index(file))
-                self.__file_cache.pop(file)
-                removed_files.append(file)
-
-        if len(changed_files) > 0 or len(removed_files) > 0:
-            self.__log()
-            self.__log(f'Changes found: {len(changed_files) + len(removed_files)}', logger.LogLevel.INFO)
-            self.__subscriber.file_monitor_action_on_change(change_list=changed_files,
-                                                            file_list=self.file_list.copy(),
-                                                            **self.action_kwargs)
-            # write changes to cache
+                self.__file_cache[file] = last_modified
+            journal_length += 1
+        return journal_length
+
+    def __ensure_cache_folder(self):
+        if not self.__cache_folder_exists:
             os_utils.persist_file_path(self.__metadata_cache_path, True)
-            with open(self.__metadata_cache_path, 'w') as f:
-                f.write(json.dumps(self.__file_cache))
+            self.__cache_folder_exists = True
 
-        time_spent = (time.time_ns() - start_time) / self.__NANO_DIVISOR
-        self.__log(f'[{FileMonitorActionType.SCAN_FILES_FOR_CHANGES}] Time spent: {time_spent}s', logger.LogLevel.DEBUG)
+    async def __find_files(self):
+        start_time = time.perf_counter_ns()
+        loop = asyncio.get_running_loop()
+        self.__update_file_list(await loop.run_in_executor(None, self.__subscriber.file_monitor_get_files))
+        if self.__debug_enabled:
+            time_spent = (time.perf_counter_ns() - start_time) / self.__NANO_DIVISOR
+            self.__log(f'[{FileMonitorActionType.SEARCH_FOR_NEW_FILES}] Time spent: {time_spent}s', logger.LogLevel.DEBUG)
 
-    def __find_files(self):
-        start_time = time.time_ns()
-        self.file_list = self.__subscriber.file_monitor_get_files()
-        time_spent = (time.time_ns() - start_time) / self.__NANO_DIVISOR
-        self.__log(f'[{FileMonitorActionType.SEARCH_FOR_NEW_FILES}] Time spent: {time_spent}s', logger.LogLevel.DEBUG)
+    def __update_file_list(self, file_list: list):
+        self.file_list = file_list
+        self.__file_set = set(file_list)
 
     def __queue_new_action(self, action_type: FileMonitorActionType):
-        if action_type == FileMonitorActionType.SEARCH_FOR_NEW_FILES and self.__new_files_search_frequency > 0:
+        if action_type == FileMonitorActionType.SEARCH_FOR_NEW_FILES and self.__new_files_search_period_ns is not None:
             self.__action_queue.put(
                 FileMonitorAction(
                     FileMonitorActionType.SEARCH_FOR_NEW_FILES,
-                    time.time_ns() + self.__NANO_SECS_IN_HOUR // self.__new_files_search_frequency
+                    time.monotonic_ns() + self.__new_files_search_period_ns
                 )
             )
-        elif action_type == FileMonitorActionType.SCAN_FILES_FOR_CHANGES and self.__file_update_scan_frequency > 0:
+        elif action_type == FileMonitorActionType.SCAN_FILES_FOR_CHANGES and \
+                self.__file_update_scan_period_ns is not None:
             self.__action_queue.put(
                 FileMonitorAction(
                     FileMonitorActionType.SCAN_FILES_FOR_CHANGES,
-                    time.time_ns() + self.__NANO_SECS_IN_HOUR // self.__file_update_scan_frequency
+                    time.monotonic_ns() + self.__file_update_scan_period_ns
                 )
             )
 
@@ -1,7 +1,7 @@
 import os
 
-import pythontoolbox.filemonitor.logger as logging
-import utility.os_utils as osutils
+import pytoolbox.utility.logger as logging
+import pytoolbox.utility.os as osutils
 
 """
     GENERIC SETTINGS
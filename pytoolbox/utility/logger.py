@@ -14,14 +14,22 @@ class LogManager:
         self.__output_type = output_type
         self.__log_level = self.__get_log_level_type(log_level)
 
-    def log(self, message: str = None, log_level=LogLevel.INFO):
-        if self.__log_level.value >= self.__get_log_level_type(log_level).value:
+    def log(self, message=None, log_level=LogLevel.INFO):
+        """Prints the message if the log level is enabled. The message may be a callable returning the message, in
+        which case it is only called when the message is actually printed.
+        """
+        if self.is_enabled(log_level):
+            if callable(message):
+                message = message()
             if message:
                 print(f'[{datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")}][{log_level.name}][{self.__domain_name}] {message}')
             else:
                 # New line
                 print()
 
+    def is_enabled(self, log_level) -> bool:
+        return self.__log_level.value >= self.__get_log_level_type(log_level).value
+
     @staticmethod
     def __get_log_level_type(log_level):
         if isinstance(log_level, LogLevel):
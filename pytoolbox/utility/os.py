@@ -9,9 +9,9 @@ def persist_file_path(file_path: str, is_file=False) -> None:
 
 
 def remove_last_part_of_path(file_path: str, repetitions=1) -> str:
-    for i in range(repetitions):
-        sep_loc = file_path.rfind(os.sep)
-        altsep_loc = file_path.rfind(os.altsep)
-        loc = max(sep_loc, altsep_loc)
-        file_path = file_path[:max(sep_loc, altsep_loc)] if loc != -1 else ''
+    for _ in range(repetitions):
+        parent = os.path.dirname(file_path)
+        if parent == file_path:
+            return ''
+        file_path = parent
     return file_path
@@ -1,23 +1,346 @@
+import asyncio
+import contextlib
+import io
+import json
+import marshal
+import os
+import shutil
+import tempfile
 import unittest
+import unittest.mock
 from pytoolbox.filemonitor import filemonitor as fm
 import pytoolbox.settings as settings
+import pytoolbox.utility.logger as logger
 
 
 class FileMonitorableClass(fm.FileMonitorable):
 
+    def __init__(self, files):
+        self.files = files
+        self.changes = []
+        self.file_lists = []
+
     @property
     def id(self):
         return "Test FileMonitorable Class"
 
     def file_monitor_get_files(self) -> list:
-        return
+        return list(self.files)
+
+    def file_monitor_action_on_change(self, change_list, file_list, **kwargs) -> None:
+        self.changes.append(sorted(change_list))
+        self.file_lists.append(sorted(file_list))
+
+
+class DirRootsFileMonitorableClass(FileMonitorableClass):
+
+    def __init__(self, files, dir_roots):
+        super().__init__(files)
+        self.dir_roots = dir_roots
+
+    def file_monitor_get_dir_roots(self) -> list:
+        return self.dir_roots
+
+
+class FileMonitorTestCase(unittest.TestCase):
+    """Runs a polling monitor for a short while against files in a temporary folder"""
+    SCANS_PER_HOUR = 3600 * 20
+    FILE_COUNT = 10
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        for name, value in (('DATA_CACHE_FOLDER', os.path.join(self.temp_dir, 'cache')),
+                            ('LOG_LEVEL', logger.LogLevel.ERROR)):
+            self.addCleanup(setattr, settings, name, getattr(settings, name))
+            setattr(settings, name, value)
+        self.files = [os.path.join(self.temp_dir, f'test_file_{i}') for i in range(self.FILE_COUNT)]
+        for file in self.files:
+            with open(file, 'w') as f:
+                f.write('test')
+        self.subscriber = FileMonitorableClass(self.files)
+        cache_folder = os.path.join(settings.DATA_CACHE_FOLDER, settings.FILE_MONITOR_CACHE_FOLDER_NAME)
+        self.cache_path = os.path.join(cache_folder, self.subscriber.id + '.cache')
+        self.journal_path = os.path.join(cache_folder, self.subscriber.id + '.jrn')
+
+    @staticmethod
+    def touch(*files):
+        for file in files:
+            file_stat = os.stat(file)
+            os.utime(file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1000000000))
+
+    def last_modified_times(self) -> dict:
+        return {file: os.stat(file).st_mtime_ns for file in self.files}
+
+    def read_snapshot(self) -> dict:
+        with open(self.cache_path, 'rb') as f:
+            return marshal.loads(f.read())
+
+    def read_journal(self) -> list:
+        with open(self.journal_path, 'rb') as f:
+            journal = io.BytesIO(f.read())
+        entries = []
+        while journal.tell() < len(journal.getbuffer()):
+            entries.append(marshal.load(journal))
+        return entries
+
+    def run_monitor(self, *files_to_touch) -> list:
+        """Runs a new monitor, touches the files once it has scanned, and returns the changes it reported."""
+        self.subscriber.changes = []
+        monitor = fm.FileMonitor(self.subscriber,
+                                 new_files_search_frequency=0,
+                                 file_update_scan_frequency=self.SCANS_PER_HOUR,
+                                 use_file_watcher=False,
+                                 debounce_ms=0)
+
+        async def run():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.3)
+            if len(files_to_touch) > 0:
+                self.touch(*files_to_touch)
+                await asyncio.sleep(0.3)
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        return self.subscriber.changes
+
+    def run_with_monitor(self, test, **kwargs):
+        """Runs a new monitor with a fresh cache, waits for it to report every file, and then awaits the test."""
+        kwargs = {
+            'new_files_search_frequency': 0,
+            'file_update_scan_frequency': self.SCANS_PER_HOUR,
+            'use_file_watcher': False,
+            'debounce_ms': 0,
+            'fresh_start': True,
+            **kwargs
+        }
+        self.subscriber.changes = []
+        self.subscriber.file_lists = []
+        monitor = fm.FileMonitor(self.subscriber, **kwargs)
+
+        async def run():
+            task = asyncio.create_task(monitor.run())
+            try:
+                await self.wait_for_changes(1)
+                self.subscriber.changes.clear()
+                self.subscriber.file_lists.clear()
+                await test()
+            finally:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+
+    async def wait_for_changes(self, count: int, timeout: float = 5):
+        """Waits until the subscriber has received count actions."""
+        for _ in range(int(timeout / 0.02)):
+            if len(self.subscriber.changes) >= count:
+                return
+            await asyncio.sleep(0.02)
+        self.fail(f'Expected {count} actions, got {self.subscriber.changes}')
+
+
+class TestMonitorActionQueue(unittest.TestCase):
+    def test_actions_are_returned_in_time_order(self):
+        queue = fm.FileMonitorActionQueue()
+        action_times = [5, 1, 9, 3, 7, 2]
+        for action_time in action_times:
+            queue.put(fm.FileMonitorAction(fm.FileMonitorActionType.SCAN_FILES_FOR_CHANGES, action_time))
+        self.assertEqual(queue.peek().action_time, 1)
+        self.assertEqual([queue.get().action_time for _ in action_times], sorted(action_times))
+        self.assertIsNone(queue.peek())
+        self.assertIsNone(queue.get())
+
+
+class TestFileCache(FileMonitorTestCase):
+    def test_legacy_json_cache_is_migrated(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as f:
+            f.write(json.dumps(self.last_modified_times()))
+        fm.FileMonitor(self.subscriber, use_file_watcher=False)
+        self.assertEqual(self.read_snapshot(), self.last_modified_times())
+        self.assertEqual(self.run_monitor(), [])
+
+    def test_changes_are_journaled_and_replayed(self):
+        self.assertEqual(self.run_monitor(), [sorted(self.files)])
+        snapshot = self.read_snapshot()
+        self.assertEqual(snapshot, self.last_modified_times())
+        self.assertEqual(self.read_journal(), [])
+
+        self.assertEqual(self.run_monitor(self.files[0]), [[self.files[0]]])
+        self.assertEqual(self.read_snapshot(), snapshot)
+        self.assertEqual(self.read_journal(), [(self.files[0], os.stat(self.files[0]).st_mtime_ns)])
+        # A restarted monitor replays the journal and finds nothing new
+        self.assertEqual(self.run_monitor(), [])
+
+    def test_removed_files_are_journaled(self):
+        self.run_monitor()
+        os.remove(self.files[0])
+        self.assertEqual(self.run_monitor(), [[]])
+        self.assertEqual(self.read_journal(), [(self.files[0], None)])
+
+    def test_journal_is_compacted_past_the_threshold(self):
+        self.run_monitor()
+        # 2 of 10 entries stays below 25% of the cache
+        self.run_monitor(*self.files[:2])
+        self.assertEqual(len(self.read_journal()), 2)
+        self.run_monitor(self.files[2])
+        self.assertEqual(self.read_journal(), [])
+        self.assertEqual(self.read_snapshot(), self.last_modified_times())
+        self.assertEqual(self.run_monitor(), [])
+
+    def test_corrupt_journal_is_ignored_and_compacted(self):
+        self.run_monitor()
+        self.run_monitor(self.files[0])
+        with open(self.journal_path, 'ab') as f:
+            f.write(b'\x01garbage')
+        # The entries before the corruption are still applied
+        self.assertEqual(self.run_monitor(self.files[1]), [[self.files[1]]])
+        self.assertEqual(self.read_journal(), [])
+        self.assertEqual(self.read_snapshot(), self.last_modified_times())
+
+    def test_truncated_journal_is_ignored_and_compacted(self):
+        self.run_monitor()
+        self.run_monitor(*self.files[:2])
+        with open(self.journal_path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.journal_path) - 3)
+        # The cut off entry is lost, so that file is reported again
+        self.assertEqual(self.run_monitor(), [[self.files[1]]])
+        self.assertEqual(self.read_journal(), [])
+        self.assertEqual(self.read_snapshot(), self.last_modified_times())
+
+
+class TestDirRoots(FileMonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.temp_dir, 'root')
+        os.makedirs(os.path.join(self.root, 'sub'))
+        self.files = [os.path.join(self.root, 'sub', f'test_file_{i}') for i in range(3)] + [self.files[0]]
+        for file in self.files:
+            with open(file, 'w') as f:
+                f.write('test')
+        self.subscriber = DirRootsFileMonitorableClass(self.files, [self.root])
+
+    def test_changes_under_and_outside_the_roots_are_reported(self):
+        async def test():
+            self.touch(self.files[1])
+            await self.wait_for_changes(1)
+            # Monitored file outside of the roots
+            self.touch(self.files[3])
+            await self.wait_for_changes(2)
+            self.assertEqual(self.subscriber.changes, [[self.files[1]], [self.files[3]]])
+
+        self.run_with_monitor(test)
+
+    def test_removed_file_under_the_roots_is_reported(self):
+        async def test():
+            os.remove(self.files[0])
+            await self.wait_for_changes(1)
+            self.assertEqual(self.subscriber.changes, [[]])
+            self.assertEqual(self.subscriber.file_lists, [sorted(self.files[1:])])
+
+        self.run_with_monitor(test)
+
+
+class TestDebounce(FileMonitorTestCase):
+    def test_polling_holds_back_changes_within_the_window(self):
+        async def test():
+            self.touch(self.files[0])
+            await asyncio.sleep(0.1)
+            self.touch(self.files[1])
+            await asyncio.sleep(0.1)
+            self.assertEqual(self.subscriber.changes, [])
+            await self.wait_for_changes(1)
+            await asyncio.sleep(0.2)
+            self.assertEqual(self.subscriber.changes, [sorted(self.files[:2])])
+
+        self.run_with_monitor(test, debounce_ms=500)
+
+    @unittest.skipIf(fm.watchfiles is None, 'watchfiles is not installed')
+    def test_watcher_reports_a_burst_in_one_action(self):
+        async def test():
+            for file in self.files:
+                with open(file, 'a') as f:
+                    f.write('burst')
+                await asyncio.sleep(0.01)
+            await self.wait_for_changes(1)
+            await asyncio.sleep(0.5)
+            self.assertEqual(self.subscriber.changes, [sorted(self.files)])
+
+        self.run_with_monitor(test, use_file_watcher=True, debounce_ms=1000)
+
+
+@unittest.skipIf(fm.watchfiles is None, 'watchfiles is not installed')
+class TestFileWatcher(FileMonitorTestCase):
+    def run_with_watcher(self, test, **kwargs):
+        self.run_with_monitor(test, use_file_watcher=True, debounce_ms=50, **kwargs)
+
+    def test_modification_is_reported(self):
+        async def test():
+            with open(self.files[0], 'a') as f:
+                f.write('change')
+            await self.wait_for_changes(1)
+            self.assertEqual(self.subscriber.changes, [[self.files[0]]])
+
+        self.run_with_watcher(test)
+
+    def test_deletion_is_reported_as_removal(self):
+        async def test():
+            os.remove(self.files[0])
+            await self.wait_for_changes(1)
+            self.assertEqual(self.subscriber.changes, [[]])
+            self.assertEqual(self.subscriber.file_lists, [sorted(self.files[1:])])
+
+        self.run_with_watcher(test)
+
+    def test_new_file_in_new_directory_is_watched(self):
+        new_file = os.path.join(self.temp_dir, 'new', 'new_file')
+
+        async def test():
+            os.makedirs(os.path.dirname(new_file))
+            with open(new_file, 'w') as f:
+                f.write('test')
+            self.files.append(new_file)
+            await self.wait_for_changes(1)
+            self.assertEqual(self.subscriber.changes, [[new_file]])
+            with open(new_file, 'a') as f:
+                f.write('change')
+            await self.wait_for_changes(2)
+            self.assertEqual(self.subscriber.changes[1], [new_file])
+
+        self.run_with_watcher(test, new_files_search_frequency=3600 * 10)
+
+    def test_changing_file_set_does_not_drop_events(self):
+        # The missing file is found by every search and removed by the next scan, so the file set keeps changing
+        self.files.append(os.path.join(self.temp_dir, 'missing_file'))
 
+        async def test():
+            for i in range(10):
+                self.touch(self.files[0])
+                for _ in range(100):
+                    if sum(change == [self.files[0]] for change in self.subscriber.changes) == i + 1:
+                        break
+                    await asyncio.sleep(0.02)
+                else:
+                    self.fail(f'Modification {i + 1} was not reported')
+                await asyncio.sleep(0.1)
 
+        self.run_with_watcher(test, new_files_search_frequency=3600 * 10)
 
+    def test_falls_back_to_scanning_when_the_watch_fails(self):
+        async def test():
+            self.touch(self.files[0])
+            await self.wait_for_changes(1)
+            self.assertEqual(self.subscriber.changes, [[self.files[0]]])
 
-class TestMonitorAction(unittest.TestCase):
-    def test(self):
-        settings.
+        async def failing_awatch(*args, **kwargs):
+            raise OSError('inotify watch limit reached')
+            yield
 
-    def __init__(self, methodName: str = ...) -> None:
-        super().__init__(methodName)
+        with unittest.mock.patch.object(fm.watchfiles, 'awatch', failing_awatch):
+            self.run_with_watcher(test)
@@ -0,0 +1,50 @@
+import contextlib
+import io
+import os
+import unittest
+import pytoolbox.utility.logger as logger
+import pytoolbox.utility.os as os_utils
+
+
+class TestLogManager(unittest.TestCase):
+    def setUp(self):
+        self.log_manager = logger.LogManager('Test', logger.LogLevel.INFO)
+        self.calls = 0
+
+    def message(self):
+        self.calls += 1
+        return 'lazy message'
+
+    def test_callable_message_is_not_called_when_suppressed(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.log_manager.log(self.message, logger.LogLevel.DEBUG)
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_callable_message_is_called_when_enabled(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.log_manager.log(self.message, logger.LogLevel.INFO)
+        self.assertEqual(self.calls, 1)
+        self.assertIn('[INFO][Test] lazy message', output.getvalue())
+
+    def test_is_enabled(self):
+        self.assertTrue(self.log_manager.is_enabled(logger.LogLevel.ERROR))
+        self.assertTrue(self.log_manager.is_enabled(logger.LogLevel.INFO))
+        self.assertFalse(self.log_manager.is_enabled(logger.LogLevel.DEBUG))
+
+
+class TestRemoveLastPartOfPath(unittest.TestCase):
+    def test_removes_one_part_per_repetition(self):
+        path = os.path.join(os.sep, 'a', 'b', 'c')
+        self.assertEqual(os_utils.remove_last_part_of_path(path), os.path.join(os.sep, 'a', 'b'))
+        self.assertEqual(os_utils.remove_last_part_of_path(path, 2), os.path.join(os.sep, 'a'))
+        self.assertEqual(os_utils.remove_last_part_of_path(path, 3), os.sep)
+        self.assertEqual(os_utils.remove_last_part_of_path(path, 4), '')
+
+    def test_short_paths(self):
+        self.assertEqual(os_utils.remove_last_part_of_path(os.sep + 'a'), os.sep)
+        self.assertEqual(os_utils.remove_last_part_of_path(os.sep), '')
+        self.assertEqual(os_utils.remove_last_part_of_path('a'), '')
+        self.assertEqual(os_utils.remove_last_part_of_path(''), '')